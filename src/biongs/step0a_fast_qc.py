@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import argparse
+import os
 import shutil
 import subprocess
 from pathlib import Path
@@ -22,25 +23,22 @@ def _strip_fastq_ext(filename: str) -> str:
 def find_input_fastqs(experiment_name: str, repo_root: Path) -> list[Path]:
     """Find all FASTQ inputs in input_data/{experiment}/{experiment}_fastq."""
     fastq_dir = repo_root / "input_data" / experiment_name / f"{experiment_name}_fastq"
-    if not fastq_dir.exists() or not fastq_dir.is_dir():
+    try:
+        # DirEntry caches the file type from the directory listing, so no extra stat per file.
+        with os.scandir(fastq_dir) as entries:
+            candidates = sorted(
+                [
+                    Path(entry.path)
+                    for entry in entries
+                    if entry.is_file()
+                    and entry.name.endswith((".fastq", ".fq", ".fastq.gz", ".fq.gz"))
+                ],
+                key=lambda path: path.name,
+            )
+    except (FileNotFoundError, NotADirectoryError):
         raise FileNotFoundError(
             f"FASTQ directory not found: {fastq_dir}. Run Step 0 to confirm upload structure."
-        )
-
-    candidates = sorted(
-        [
-            path
-            for path in fastq_dir.iterdir()
-            if path.is_file()
-            and (
-                path.name.endswith(".fastq")
-                or path.name.endswith(".fq")
-                or path.name.endswith(".fastq.gz")
-                or path.name.endswith(".fq.gz")
-            )
-        ],
-        key=lambda path: path.name,
-    )
+        ) from None
 
     if not candidates:
         raise FileNotFoundError(f"No FASTQ files found in: {fastq_dir}")
@@ -49,12 +47,20 @@ def find_input_fastqs(experiment_name: str, repo_root: Path) -> list[Path]:
 
 
 def run_fastqc(fastq_files: list[Path], outdir: Path) -> None:
-    """Execute FastQC on all input files."""
-    if shutil.which("fastqc") is None:
+    """Execute FastQC on all input files, processing files concurrently.
+
+    FastQC analyses one file per thread, so requesting one thread per input
+    (capped at the CPU count) lets R1/R2 reports be produced in parallel.
+    Only the HTML report is kept, so FastQC is told not to unpack its zip.
+    """
+    fastqc_path = shutil.which("fastqc")
+    if fastqc_path is None:
         raise RuntimeError("fastqc is not available in PATH. Install FastQC before running Step 0a.")
 
     outdir.mkdir(parents=True, exist_ok=True)
-    cmd = ["fastqc", "--quiet", "--outdir", str(outdir)] + [str(path) for path in fastq_files]
+    threads = max(1, min(len(fastq_files), os.cpu_count() or 1))
+    cmd = [fastqc_path, "--quiet", "--noextract", "--threads", str(threads), "--outdir", str(outdir)]
+    cmd += [str(path) for path in fastq_files]
     subprocess.run(cmd, check=True)
 
 
@@ -63,25 +69,31 @@ def _expected_html_names(fastq_files: list[Path]) -> set[str]:
     return {f"{_strip_fastq_ext(path.name)}_fastqc.html" for path in fastq_files}
 
 
-def cleanup_non_html_fastqc_outputs(outdir: Path, expected_html: set[str]) -> None:
-    """Remove zip/extracted outputs and any unexpected files from the QC folder."""
-    for path in outdir.iterdir():
-        if path.is_dir() and path.name.endswith("_fastqc"):
-            shutil.rmtree(path)
-            continue
+def cleanup_non_html_fastqc_outputs(outdir: Path, expected_html: set[str]) -> list[Path]:
+    """Remove zip/extracted outputs and any unexpected files from the QC folder.
 
-        if path.is_file() and path.name.endswith("_fastqc.zip"):
-            path.unlink()
-            continue
+    Returns the expected HTML reports that were found and kept.
+    """
+    kept_html: list[Path] = []
+    with os.scandir(outdir) as entries:
+        for entry in entries:
+            path = Path(entry.path)
+            if entry.is_dir():
+                if entry.name.endswith("_fastqc"):
+                    shutil.rmtree(path)
+                continue
 
-        if path.is_file() and path.suffix.lower() == ".html" and path.name in expected_html:
-            continue
+            if not entry.is_file():
+                continue
 
-        if path.is_file() and path.name == ".DS_Store":
-            continue
+            if entry.name.endswith("_fastqc.zip"):
+                path.unlink()
+            elif path.suffix.lower() == ".html" and entry.name in expected_html:
+                kept_html.append(path)
+            elif entry.name != ".DS_Store":
+                path.unlink()
 
-        if path.is_file():
-            path.unlink()
+    return sorted(kept_html)
 
 
 def run_script_0_5(experiment_name: str, repo_root: Path) -> list[Path]:
@@ -91,9 +103,7 @@ def run_script_0_5(experiment_name: str, repo_root: Path) -> list[Path]:
     run_fastqc(fastq_files, outdir)
 
     expected_html = _expected_html_names(fastq_files)
-    cleanup_non_html_fastqc_outputs(outdir, expected_html)
-
-    html_paths = sorted([outdir / name for name in expected_html if (outdir / name).exists()])
+    html_paths = cleanup_non_html_fastqc_outputs(outdir, expected_html)
     if not html_paths:
         raise RuntimeError("FastQC completed but no HTML reports were found.")
 
@@ -11,7 +11,6 @@ Description: This is the first step of the pipeline. The user provides an experi
 import os
 import csv
 import argparse
-import glob
 import sys
 import atexit
 from datetime import datetime
@@ -91,7 +90,14 @@ def find_multiplexing_csv(experiment_name):
         raise FileNotFoundError(f"Experiment directory not found: {input_dir}")
     
     # Look for CSV files with 'multiplexing' in the name
-    csv_files = glob.glob(os.path.join(input_dir, "*multiplexing_info*.csv"))
+    try:
+        with os.scandir(input_dir) as entries:
+            csv_files = [
+                entry.path for entry in entries
+                if 'multiplexing_info' in entry.name and entry.name.endswith('.csv') and not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        csv_files = []
     
     if csv_files:
         return csv_files[0]
@@ -116,8 +122,6 @@ def create_demultiplex_folders(experiment_name):
     output_dir = os.path.join("results", experiment_name, "demultiplexing")
     os.makedirs(output_dir, exist_ok=True)
     print(f"Output directory: {output_dir}\n")
-    # Create the output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
     
     # Read the CSV file
     with open(csv_path, 'r') as csvfile:
@@ -6,21 +6,24 @@ Output: For each population in the multiplexing CSV, process its corresponding f
         (matched by GW_name) and extract reads with matching indexes; create additional 
         files for short reads and unmatched reads
 Dependencies: Step 1 (step1_demultiplex_folders.py) must be run first
-Description: Using biopython, for each population in the CSV, find fastq files matching
+Description: For each population in the CSV, find fastq files matching
              its GW_name, detect the forward (first 8 bp of R1) and reverse (first 8 bp 
              of R2) indexes, and extract reads that match that population's indexes.
-             Reads below the short_read_length threshold are saved separately.
+             Populations sharing a GW_name are demultiplexed in a single pass over
+             their fastq files. Reads below the short_read_length threshold are saved separately.
 """
 
 import os
+import io
 import csv
 import argparse
-import glob
+import contextlib
+import fnmatch
 import gzip
 import sys
 import atexit
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from Bio import SeqIO
 
 
 class TeeStream:
@@ -89,7 +92,14 @@ def find_multiplexing_csv(experiment_name):
     input_dir = os.path.join("input_data", experiment_name)
     
     # Look for CSV files with 'multiplexing_info' in the name
-    csv_files = glob.glob(os.path.join(input_dir, "*multiplexing_info*.csv"))
+    try:
+        with os.scandir(input_dir) as entries:
+            csv_files = [
+                entry.path for entry in entries
+                if 'multiplexing_info' in entry.name and entry.name.endswith('.csv') and not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        csv_files = []
     
     if csv_files:
         return csv_files[0]
@@ -97,7 +107,34 @@ def find_multiplexing_csv(experiment_name):
     raise FileNotFoundError(f"No multiplexing info CSV file found in {input_dir}")
 
 
-def find_fastq_files(experiment_name, gw_name):
+def list_input_fastq_files(experiment_name):
+    """
+    List every FASTQ file under an experiment's input directory in a single walk.
+    Hidden files and directories are skipped, as glob does.
+    
+    Parameters:
+    -----------
+    experiment_name : str
+        Name of the experiment
+        
+    Returns:
+    --------
+    list
+        Paths to all .fastq, .fq, .fastq.gz and .fq.gz files under input_data/{experiment_name}
+    """
+    input_dir = os.path.join("input_data", experiment_name)
+    
+    fastq_paths = []
+    for dirpath, dirnames, filenames in os.walk(input_dir, followlinks=True):
+        dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith('.')]
+        for filename in filenames:
+            if not filename.startswith('.') and filename.endswith(('.fastq', '.fq', '.fastq.gz', '.fq.gz')):
+                fastq_paths.append(os.path.join(dirpath, filename))
+    
+    return fastq_paths
+
+
+def find_fastq_files(experiment_name, gw_name, fastq_paths=None):
     """
     Find R1 and R2 fastq files for a given experiment and GW_name.
     Handles both regular and gzipped fastq files.
@@ -108,35 +145,28 @@ def find_fastq_files(experiment_name, gw_name):
         Name of the experiment
     gw_name : str
         GW_name of the population (e.g., "P22R1")
+    fastq_paths : list or None
+        Input fastq paths from list_input_fastq_files; listed here if not given
         
     Returns:
     --------
     tuple or None
         (r1_path, r2_path) paths to the R1 and R2 fastq files, or None if not found
     """
-    input_dir = os.path.join("input_data", experiment_name)
-    
-    # Search for R1 and R2 files recursively (including gzipped)
-    r1_patterns = [
-        os.path.join(input_dir, "**", f"{gw_name}_R1*.fastq"),
-        os.path.join(input_dir, "**", f"{gw_name}_R1*.fq"),
-        os.path.join(input_dir, "**", f"{gw_name}_R1*.fastq.gz"),
-        os.path.join(input_dir, "**", f"{gw_name}_R1*.fq.gz"),
-    ]
-    r2_patterns = [
-        os.path.join(input_dir, "**", f"{gw_name}_R2*.fastq"),
-        os.path.join(input_dir, "**", f"{gw_name}_R2*.fq"),
-        os.path.join(input_dir, "**", f"{gw_name}_R2*.fastq.gz"),
-        os.path.join(input_dir, "**", f"{gw_name}_R2*.fq.gz"),
-    ]
+    if fastq_paths is None:
+        fastq_paths = list_input_fastq_files(experiment_name)
     
+    # Match file names against each pattern in turn, so uncompressed files are preferred
+    extensions = ['.fastq', '.fq', '.fastq.gz', '.fq.gz']
     r1_files = []
     r2_files = []
     
-    for pattern in r1_patterns:
-        r1_files.extend(glob.glob(pattern, recursive=True))
-    for pattern in r2_patterns:
-        r2_files.extend(glob.glob(pattern, recursive=True))
+    for extension in extensions:
+        r1_pattern = f"{gw_name}_R1*{extension}"
+        r1_files.extend(path for path in fastq_paths if fnmatch.fnmatchcase(os.path.basename(path), r1_pattern))
+    for extension in extensions:
+        r2_pattern = f"{gw_name}_R2*{extension}"
+        r2_files.extend(path for path in fastq_paths if fnmatch.fnmatchcase(os.path.basename(path), r2_pattern))
     
     if not r1_files or not r2_files:
         return None
@@ -147,52 +177,117 @@ def find_fastq_files(experiment_name, gw_name):
     return r1_path, r2_path
 
 
-def open_fastq_file(path):
-    """Open FASTQ files in text mode, supporting both plain and gzipped files."""
+def advise_sequential_read(handle):
+    """Tell the kernel a file will be read front to back so it can read ahead aggressively."""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def open_fastq_file(path, buffer_size=128 * 1024):
+    """Open FASTQ files in binary mode with a large read buffer, supporting both plain and gzipped files."""
     if path.endswith('.gz'):
-        return gzip.open(path, 'rt')
-    return open(path, 'r')
+        # GzipFile only buffers 8 KiB of decompressed data by default
+        handle = io.BufferedReader(gzip.open(path, 'rb'), buffer_size=buffer_size)
+    else:
+        handle = open(path, 'rb', buffering=buffer_size)
+    advise_sequential_read(handle)
+    return handle
+
+
+def read_paired_fastq_records(r1_handle, r2_handle):
+    """
+    Yield matching R1/R2 FASTQ records from two files opened in binary mode.
+    
+    Parameters:
+    -----------
+    r1_handle : file object
+        R1 FASTQ file opened with mode 'rb'
+    r2_handle : file object
+        R2 FASTQ file opened with mode 'rb'
+        
+    Yields:
+    -------
+    tuple
+        (r1_record, r2_record), each a (title, sequence, quality) tuple of bytes
+        with the leading '@' and line endings removed
+    """
+    # Zipping the file iterators with themselves takes four lines from each file
+    # per step in C, so both mates advance with a single call per read pair
+    r1_lines = iter(r1_handle)
+    r2_lines = iter(r2_handle)
+    for r1_header, r1_seq, _, r1_qual, r2_header, r2_seq, _, r2_qual in zip(
+        r1_lines, r1_lines, r1_lines, r1_lines, r2_lines, r2_lines, r2_lines, r2_lines
+    ):
+        yield (
+            (r1_header[1:].rstrip(b'\r\n'), r1_seq.rstrip(b'\r\n'), r1_qual.rstrip(b'\r\n')),
+            (r2_header[1:].rstrip(b'\r\n'), r2_seq.rstrip(b'\r\n'), r2_qual.rstrip(b'\r\n')),
+        )
+
+
+class FastqBatchWriter:
+    """Collect formatted FASTQ records in memory and write them to disk in large batches."""
+
+    def __init__(self, path, batch_size=256 * 1024):
+        self.handle = open(path, 'wb')
+        self.buffer = bytearray()
+        self.batch_size = batch_size
+
+    def write(self, record):
+        """Append a (title, sequence, quality) record, writing the batch out once it is full."""
+        self.buffer += b"@%b\n%b\n+\n%b\n" % record
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.handle.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.handle.close()
 
 
 def load_populations(csv_path):
     """
-    Load all populations and their information from CSV.
+    Stream all populations and their information from CSV, one row at a time.
     
     Parameters:
     -----------
     csv_path : str
         Path to CSV file with population and index information
         
-    Returns:
-    --------
-    list
-        List of dictionaries containing population information
+    Yields:
+    -------
+    dict
+        Population information for each row of the CSV
     """
-    populations = []
-    
     with open(csv_path, 'r') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
-            populations.append({
+            yield {
                 'GW_name': row['GW_name'],
                 'Population': row['Population'],
                 'Time': row['Time'],
                 'R1_index': row['R1_index'],
                 'R2_index': row['R2_index']
-            })
-    
-    return populations
+            }
 
 
-def process_population_reads(population_info, r1_fastq, r2_fastq, output_dir, short_read_length=150):
+def process_gw_reads(gw_name, populations, r1_fastq, r2_fastq, output_dir, short_read_length=150):
     """
-    Process paired-end reads for a single population, extracting reads that match
-    the population's indexes.
+    Process paired-end reads for one GW_name in a single pass, routing each read
+    to the population whose indexes it matches.
     
     Parameters:
     -----------
-    population_info : dict
-        Dictionary with GW_name, Population, Time, R1_index, R2_index
+    gw_name : str
+        GW_name shared by the populations (e.g., "P22R1")
+    populations : list
+        Dictionaries with GW_name, Population, Time, R1_index, R2_index for every
+        population sequenced in this pair of fastq files
     r1_fastq : str
         Path to R1 input fastq file
     r2_fastq : str
@@ -205,163 +300,258 @@ def process_population_reads(population_info, r1_fastq, r2_fastq, output_dir, sh
     Returns:
     --------
     dict
-        Dictionary with counts of total, short, matched, and unmatched reads
+        Dictionary with counts of total, short, matched, and unmatched reads, plus
+        'matched_by_population' mapping each population name to its matched reads
     """
-    gw_name = population_info['GW_name']
-    population = f"P{population_info['Population']}"
-    r1_index = population_info['R1_index']
-    r2_index = population_info['R2_index']
-    
     # Initialize counters
     counts = {
         'total': 0,
         'short': 0,
         'unmatched': 0,
-        'matched': 0
+        'matched': 0,
+        'matched_by_population': {}
     }
     
-    # Set up output files
-    pop_folder = os.path.join(output_dir, population)
-    pop_r1_file = os.path.join(pop_folder, f"{population}_R1.fastq")
-    pop_r2_file = os.path.join(pop_folder, f"{population}_R2.fastq")
+    # Open batched output writers for each population, routed by its R1 + R2 index pair
+    # as one 16-byte key so each read costs a single bytes hash and dict lookup
+    routes = {}
+    population_writers = []
+    for pop_info in populations:
+        population = f"P{pop_info['Population']}"
+        pop_folder = os.path.join(output_dir, population)
+        pop_r1_writer = FastqBatchWriter(os.path.join(pop_folder, f"{population}_R1.fastq"))
+        pop_r2_writer = FastqBatchWriter(os.path.join(pop_folder, f"{population}_R2.fastq"))
+        population_writers.extend((pop_r1_writer, pop_r2_writer))
+        
+        counts['matched_by_population'][population] = 0
+        
+        # Only 8 bp indexes can match a read's 8 bp prefixes; keying anything else would
+        # let a short R1 index borrow bases from R2 in the concatenated key
+        r1_index = pop_info['R1_index'].encode('ascii')
+        r2_index = pop_info['R2_index'].encode('ascii')
+        if len(r1_index) == 8 and len(r2_index) == 8:
+            routes.setdefault(r1_index + r2_index, []).append((population, pop_r1_writer.write, pop_r2_writer.write))
     
     short_r1_path = os.path.join(output_dir, f"{gw_name}_short_reads_R1.fastq")
     short_r2_path = os.path.join(output_dir, f"{gw_name}_short_reads_R2.fastq")
     unmatched_r1_path = os.path.join(output_dir, f"{gw_name}_unmatched_reads_R1.fastq")
     unmatched_r2_path = os.path.join(output_dir, f"{gw_name}_unmatched_reads_R2.fastq")
     
-    # Open file handles
-    pop_r1_handle = open(pop_r1_file, 'w')
-    pop_r2_handle = open(pop_r2_file, 'w')
-    short_r1_handle = open(short_r1_path, 'w')
-    short_r2_handle = open(short_r2_path, 'w')
-    unmatched_r1_handle = open(unmatched_r1_path, 'w')
-    unmatched_r2_handle = open(unmatched_r2_path, 'w')
+    short_r1_writer = FastqBatchWriter(short_r1_path)
+    short_r2_writer = FastqBatchWriter(short_r2_path)
+    unmatched_r1_writer = FastqBatchWriter(unmatched_r1_path)
+    unmatched_r2_writer = FastqBatchWriter(unmatched_r2_path)
+    matched_by_population = counts['matched_by_population']
+    
+    # Count in local variables inside the loop and store them in counts afterwards
+    total = short = matched = unmatched = 0
+    
+    # Bind the methods used per read to locals so the loop skips repeated attribute lookups
+    find_targets = routes.get
+    write_short_r1 = short_r1_writer.write
+    write_short_r2 = short_r2_writer.write
+    write_unmatched_r1 = unmatched_r1_writer.write
+    write_unmatched_r2 = unmatched_r2_writer.write
     
     # Parse both fastq files simultaneously
     with open_fastq_file(r1_fastq) as r1_handle, open_fastq_file(r2_fastq) as r2_handle:
-        r1_records = SeqIO.parse(r1_handle, 'fastq')
-        r2_records = SeqIO.parse(r2_handle, 'fastq')
-        
-        for r1_record, r2_record in zip(r1_records, r2_records):
-            counts['total'] += 1
+        for r1_record, r2_record in read_paired_fastq_records(r1_handle, r2_handle):
+            total += 1
             
-            # Verify that R1 and R2 match by checking headers
-            r1_id = r1_record.id.split()[0]
-            r2_id = r2_record.id.split()[0]
+            # Verify that R1 and R2 match by checking headers (splitting off only the ID)
+            r1_id = r1_record[0].split(None, 1)[0]
+            r2_id = r2_record[0].split(None, 1)[0]
             
             if r1_id != r2_id:
                 print(f"Warning: R1 and R2 IDs do not match!")
-                print(f"  R1: {r1_id}")
-                print(f"  R2: {r2_id}")
+                print(f"  R1: {r1_id.decode()}")
+                print(f"  R2: {r2_id.decode()}")
                 continue
             
+            r1_seq = r1_record[1]
+            r2_seq = r2_record[1]
+            
             # Check if read is too short
-            if len(r1_record.seq) < short_read_length or len(r2_record.seq) < short_read_length:
-                SeqIO.write(r1_record, short_r1_handle, 'fastq')
-                SeqIO.write(r2_record, short_r2_handle, 'fastq')
-                counts['short'] += 1
+            if len(r1_seq) < short_read_length or len(r2_seq) < short_read_length:
+                write_short_r1(r1_record)
+                write_short_r2(r2_record)
+                short += 1
                 continue
             
-            # Extract the first 8 base pairs as indexes
-            read_r1_index = str(r1_record.seq[:8])
-            read_r2_index = str(r2_record.seq[:8])
+            # Look up the population(s) for the first 8 base pairs of each mate
+            targets = find_targets(r1_seq[:8] + r2_seq[:8])
             
-            # Check if indexes match this population
-            if read_r1_index == r1_index and read_r2_index == r2_index:
+            if targets is not None:
                 # Write to the population files
-                SeqIO.write(r1_record, pop_r1_handle, 'fastq')
-                SeqIO.write(r2_record, pop_r2_handle, 'fastq')
-                counts['matched'] += 1
+                for population, write_pop_r1, write_pop_r2 in targets:
+                    write_pop_r1(r1_record)
+                    write_pop_r2(r2_record)
+                    matched_by_population[population] += 1
+                matched += 1
             else:
                 # Write to unmatched files
-                SeqIO.write(r1_record, unmatched_r1_handle, 'fastq')
-                SeqIO.write(r2_record, unmatched_r2_handle, 'fastq')
-                counts['unmatched'] += 1
+                write_unmatched_r1(r1_record)
+                write_unmatched_r2(r2_record)
+                unmatched += 1
             
-            # Print progress every 10000 reads
-            if counts['total'] % 10000 == 0:
-                print(f"  Processed {counts['total']} reads...")
-    
-    # Close all file handles
-    pop_r1_handle.close()
-    pop_r2_handle.close()
-    short_r1_handle.close()
-    short_r2_handle.close()
-    unmatched_r1_handle.close()
-    unmatched_r2_handle.close()
-    
+            # Print progress every 16384 reads (a bit mask is cheaper than a modulo)
+            if (total & 16383) == 0:
+                print(f"  Processed {total} reads...")
+    
+    # Write out remaining batches and close all files
+    for writer in population_writers:
+        writer.close()
+    short_r1_writer.close()
+    short_r2_writer.close()
+    unmatched_r1_writer.close()
+    unmatched_r2_writer.close()
+    
+    counts['total'] = total
+    counts['short'] = short
+    counts['matched'] = matched
+    counts['unmatched'] = unmatched
     return counts
 
 
-def demultiplex_all_populations(experiment_name, csv_path, output_dir, short_read_length=150):
+def demultiplex_gw(experiment_name, gw_name, gw_populations, output_dir, short_read_length=150, fastq_paths=None):
     """
-    Process all populations in the CSV, finding and demultiplexing their fastq files.
+    Find the fastq files for one GW_name and demultiplex them into its populations.
     
     Parameters:
     -----------
     experiment_name : str
         Name of the experiment
-    csv_path : str
-        Path to the multiplexing CSV file
+    gw_name : str
+        GW_name shared by the populations
+    gw_populations : list
+        Population dictionaries for this GW_name, in CSV order
     output_dir : str
         Output directory for demultiplexed files
     short_read_length : int
         Threshold for short reads in base pairs (default 150)
+    fastq_paths : list or None
+        Input fastq paths from list_input_fastq_files; listed here if not given
+        
+    Returns:
+    --------
+    dict or None
+        Read counts from process_gw_reads, or None if no fastq files were found
     """
-    # Load all populations
-    populations = load_populations(csv_path)
+    print(f"Processing GW_name: {gw_name}")
+    for pop_info in gw_populations:
+        print(f"  P{pop_info['Population']} expected indexes - "
+              f"R1: {pop_info['R1_index']}, R2: {pop_info['R2_index']}")
     
-    print(f"Found {len(populations)} population(s) in CSV\n")
+    # Find fastq files for these populations
+    fastq_files = find_fastq_files(experiment_name, gw_name, fastq_paths)
     
-    overall_stats = []
+    if fastq_files is None:
+        print(f"  Warning: No fastq files found for {gw_name}, skipping...")
+        print()
+        return None
     
-    for pop_info in populations:
-        gw_name = pop_info['GW_name']
-        print(f"Processing population: {gw_name}")
-        print(f"  Expected indexes - R1: {pop_info['R1_index']}, R2: {pop_info['R2_index']}")
-        
-        # Find fastq files for this population
-        fastq_files = find_fastq_files(experiment_name, gw_name)
-        
-        if fastq_files is None:
-            print(f"  Warning: No fastq files found for {gw_name}, skipping...")
-            print()
-            continue
-        
-        r1_fastq, r2_fastq = fastq_files
-        print(f"  Found R1: {r1_fastq}")
-        print(f"  Found R2: {r2_fastq}")
-        
-        # Process the reads
-        counts = process_population_reads(pop_info, r1_fastq, r2_fastq, output_dir, short_read_length)
-        
-        # Print summary for this population
-        population = f"P{pop_info['Population']}"
-        print(f"  Summary for {population} (GW_name: {gw_name}):")
-        print(f"    Total reads: {counts['total']}")
-        print(f"    Matched reads: {counts['matched']} ({counts['matched']/counts['total']*100:.2f}%)")
-        print(f"    Short reads: {counts['short']} ({counts['short']/counts['total']*100:.2f}%)")
-        print(f"    Unmatched reads: {counts['unmatched']} ({counts['unmatched']/counts['total']*100:.2f}%)")
+    r1_fastq, r2_fastq = fastq_files
+    print(f"  Found R1: {r1_fastq}")
+    print(f"  Found R2: {r2_fastq}")
+    
+    # Process the reads
+    counts = process_gw_reads(gw_name, gw_populations, r1_fastq, r2_fastq, output_dir, short_read_length)
+    
+    # Print summary for this GW_name
+    print(f"  Summary for GW_name: {gw_name}:")
+    print(f"    Total reads: {counts['total']}")
+    if counts['total'] == 0:
+        print("    No reads found in the fastq files")
         print()
-        
-        overall_stats.append({
-            'population': population,
-            'gw_name': gw_name,
-            'counts': counts
-        })
+        return counts
+    
+    # One division shared by every percentage
+    percent = 100.0 / counts['total']
+    for population, matched in counts['matched_by_population'].items():
+        print(f"    Matched reads for {population}: {matched} ({matched * percent:.2f}%)")
+    print(f"    Short reads: {counts['short']} ({counts['short'] * percent:.2f}%)")
+    print(f"    Unmatched reads: {counts['unmatched']} ({counts['unmatched'] * percent:.2f}%)")
+    print()
+    
+    return counts
+
+
+def _demultiplex_gw_in_worker(experiment_name, gw_name, gw_populations, output_dir, short_read_length, fastq_paths):
+    """Run demultiplex_gw in a worker process, returning (counts, captured terminal output)."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        counts = demultiplex_gw(experiment_name, gw_name, gw_populations, output_dir, short_read_length, fastq_paths)
+    return counts, output.getvalue()
+
+
+def demultiplex_all_populations(experiment_name, csv_path, output_dir, short_read_length=150, threads=None):
+    """
+    Process all populations in the CSV, finding and demultiplexing their fastq files.
+    Populations that share a GW_name are demultiplexed together in one pass over their files.
+    
+    Parameters:
+    -----------
+    experiment_name : str
+        Name of the experiment
+    csv_path : str
+        Path to the multiplexing CSV file
+    output_dir : str
+        Output directory for demultiplexed files
+    short_read_length : int
+        Threshold for short reads in base pairs (default 150)
+    threads : int or None
+        Number of GW_name fastq pairs to process in parallel (default: one per CPU core)
+    """
+    # Group populations by the fastq files (GW_name) they were sequenced in, keeping CSV order
+    populations_by_gw = {}
+    num_populations = 0
+    for pop_info in load_populations(csv_path):
+        populations_by_gw.setdefault(pop_info['GW_name'], []).append(pop_info)
+        num_populations += 1
+    
+    print(f"Found {num_populations} population(s) in CSV\n")
+    
+    # Walk the input directory once and match every GW_name against the same listing
+    fastq_paths = list_input_fastq_files(experiment_name)
+    
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = max(1, min(threads, len(populations_by_gw)))
+    
+    # Each GW_name has its own input and output files, so each can be processed in its own worker
+    if threads == 1:
+        results = [
+            demultiplex_gw(experiment_name, gw_name, gw_populations, output_dir, short_read_length, fastq_paths)
+            for gw_name, gw_populations in populations_by_gw.items()
+        ]
+    else:
+        print(f"Processing GW_names with {threads} worker processes\n")
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(
+                    _demultiplex_gw_in_worker, experiment_name, gw_name, gw_populations, output_dir,
+                    short_read_length, fastq_paths
+                )
+                for gw_name, gw_populations in populations_by_gw.items()
+            ]
+            results = []
+            # Print each GW_name's buffered output in CSV order so logs stay readable
+            for future in futures:
+                counts, output = future.result()
+                print(output, end='')
+                results.append(counts)
     
     # Print overall summary
     print("="*60)
     print("OVERALL DEMULTIPLEXING SUMMARY")
     print("="*60)
-    for stat in overall_stats:
-        population = stat['population']
-        gw_name = stat['gw_name']
-        counts = stat['counts']
-        print(f"{population} (GW_name: {gw_name}):")
-        print(f"  Total: {counts['total']}, Matched: {counts['matched']}, "
-              f"Short: {counts['short']}, Unmatched: {counts['unmatched']}")
+    for gw_name, counts in zip(populations_by_gw, results):
+        if counts is None:
+            continue
+        for population, matched in counts['matched_by_population'].items():
+            print(f"{population} (GW_name: {gw_name}):")
+            print(f"  Total: {counts['total']}, Matched: {matched}, "
+                  f"Short: {counts['short']}, Unmatched: {counts['unmatched']}")
     print("="*60)
 
 
@@ -379,9 +569,18 @@ def main():
         default=150,
         help='Threshold for short reads in base pairs (default: 150)'
     )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Number of GW_name fastq pairs to process in parallel (default: number of CPU cores)'
+    )
     
     args = parser.parse_args()
 
+    if args.threads is not None and args.threads < 1:
+        parser.error('--threads must be an integer >= 1')
+
     setup_terminal_logging(args.experiment_name, "demultiplex_index")
     
     # Find the CSV file
@@ -404,7 +603,7 @@ def main():
     print(f"Short read length threshold: {args.short_read_length} bp\n")
     
     # Process all populations
-    demultiplex_all_populations(args.experiment_name, csv_path, output_dir, args.short_read_length)
+    demultiplex_all_populations(args.experiment_name, csv_path, output_dir, args.short_read_length, args.threads)
 
 
 if __name__ == '__main__':
@@ -41,7 +41,14 @@ def find_multiplexing_csv(experiment_name):
     input_dir = os.path.join("input_data", experiment_name)
     
     # Look for CSV files with 'multiplexing_info' in the name
-    csv_files = glob.glob(os.path.join(input_dir, "*multiplexing_info*.csv"))
+    try:
+        with os.scandir(input_dir) as entries:
+            csv_files = [
+                entry.path for entry in entries
+                if 'multiplexing_info' in entry.name and entry.name.endswith('.csv') and not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        csv_files = []
     
     if csv_files:
         return csv_files[0]
@@ -2,25 +2,32 @@
 Step 3: Create a dictionary of UMI reads for each population
 
 Input: Demultiplexed population fastq files, UMI primer sequences from CSV
-Output: Dictionary where keys are UMI pairs and values are lists of R1 and R2 SeqRecord
-        objects that match that UMI. Dictionaries are saved in respective demultiplexing/population
-        folders as pickle files named P{population_number}_UMI_dict
+Output: Dictionary where keys are UMI pairs and values hold the raw R1 and R2 FASTQ
+        records that match that UMI, concatenated into one buffer per read. Dictionaries are
+        saved in respective demultiplexing/population folders as pickle files named
+        P{population_number}_UMI_dict, alongside a P{population_number}_UMI_counts pickle
+        holding the number of reads per UMI pair
 Dependencies: Step 2 (step2_demultiplex_index.py) must be run first
 Description: For each population, detect UMI sequences by aligning to primer sequences
              (the UMI is the 10 N bps on the primer). Forward UMIs are detected from R1,
-             reverse UMIs from R2. For each unique UMI pair, store matched full SeqRecord
-             objects plus trim positions; trimming is done in step4_alignment_prep.py.
+             reverse UMIs from R2. For each unique UMI pair, store matched full FASTQ
+             records plus trim positions; trimming is done in step4_alignment_prep.py.
+             FASTQ files are read as raw bytes rather than through Bio.SeqIO, since only
+             the ID and sequence of each read are inspected.
 """
 
 import os
+import io
+import re
 import csv
 import pickle
 import argparse
-import glob
+import contextlib
 import sys
 import atexit
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from Bio import SeqIO
 
 
 class TeeStream:
@@ -85,8 +92,8 @@ def parse_primer_for_umi(primer_sequence):
     --------
     dict
         Dictionary with keys:
-        - 'before': sequence before the N's
-        - 'after': sequence after the N's
+        - 'before': sequence before the N's (ASCII bytes)
+        - 'after': sequence after the N's (ASCII bytes)
         - 'umi_start': position where the 10 N's start
         - 'umi_end': position where the 10 N's end
     """
@@ -112,8 +119,8 @@ def parse_primer_for_umi(primer_sequence):
     n_end = n_start + 10
     
     return {
-        'before': primer_upper[:n_start],
-        'after': primer_upper[n_end:],
+        'before': primer_upper[:n_start].encode('ascii'),
+        'after': primer_upper[n_end:].encode('ascii'),
         'umi_start': n_start,
         'umi_end': n_end,
         'full_primer': primer_upper
@@ -126,56 +133,71 @@ def extract_umi_from_sequence(sequence, primer_info):
     
     Parameters:
     -----------
-    sequence : str or Bio.Seq.Seq
-        The DNA sequence to search
+    sequence : bytes
+        The DNA sequence to search (uppercase ASCII bytes, as read from the FASTQ file;
+        sequencers and Step 2's case-sensitive index match only yield uppercase reads)
     primer_info : dict
         Dictionary with primer structure info from parse_primer_for_umi
         
     Returns:
     --------
-    str or None
-        The extracted UMI sequence (10 bp), or None if primer not found
+    tuple or None
+        (UMI bytes (10 bp), trim position), or None if primer not found
+    """
+    return make_umi_extractor(primer_info)(sequence)
+
+
+def make_umi_extractor(primer_info):
+    """
+    Build a UMI extraction function with the primer parts bound as local constants.
+    
+    create_umi_dict calls the extractor twice per read pair, so binding the primer
+    fields once avoids repeating dictionary lookups and length computations per read.
+    
+    Parameters:
+    -----------
+    primer_info : dict
+        Dictionary with primer structure info from parse_primer_for_umi
+        
+    Returns:
+    --------
+    callable
+        Function taking a sequence (bytes) and returning (UMI, trim position) or None,
+        exactly as extract_umi_from_sequence does
     """
-    sequence_str = str(sequence).upper()
     primer_before = primer_info['before']
     primer_after = primer_info['after']
-    umi_start = primer_info['umi_start']
-    umi_end = primer_info['umi_end']
-    
-    # Try to find the primer parts in the sequence
-    # Look for the "before" part first
-    if primer_before:
-        before_pos = sequence_str.find(primer_before)
-        if before_pos == -1:
+    after_len = len(primer_after)
+    # Reads shorter than the full primer can never match, so skip the search for them
+    min_length = len(primer_before) + 10 + after_len
+    # A compiled literal pattern searches faster than bytes.find for these primer lengths
+    search_before = re.compile(re.escape(primer_before)).search
+    
+    def extract(sequence_str):
+        if len(sequence_str) < min_length:
             return None
         
-        # The UMI should start right after the "before" part
-        umi_pos = before_pos + len(primer_before)
-    else:
-        # If no "before" part, assume UMI starts at position 0
-        umi_pos = 0
-    
-    # Check if the "after" part matches where expected
-    if primer_after:
-        expected_after_pos = umi_pos + 10
-        if expected_after_pos + len(primer_after) > len(sequence_str):
-            return None
+        # The UMI starts right after the "before" part, or at position 0 if there is none
+        if primer_before:
+            match = search_before(sequence_str)
+            if match is None:
+                return None
+            umi_pos = match.end()
+        else:
+            umi_pos = 0
         
-        actual_after = sequence_str[expected_after_pos:expected_after_pos + len(primer_after)]
-        if actual_after != primer_after:
+        # Trim position is after the entire primer: "before" + UMI + "after"
+        trim_pos = umi_pos + 10 + after_len
+        if trim_pos > len(sequence_str):
             return None
-    else:
-        # If no "after" part, just check that we have enough sequence
-        if umi_pos + 10 > len(sequence_str):
+        
+        # Check if the "after" part matches where expected
+        if primer_after and not sequence_str.startswith(primer_after, umi_pos + 10):
             return None
+        
+        return sequence_str[umi_pos:umi_pos + 10], trim_pos
     
-    # Extract the UMI
-    umi = sequence_str[umi_pos:umi_pos + 10]
-    
-    # Calculate the trim position (position after entire primer: "before" + UMI + "after")
-    trim_pos = umi_pos + 10 + len(primer_after)
-    
-    return umi, trim_pos
+    return extract
 
 
 def load_primers_from_csv(primer_csv_path):
@@ -231,7 +253,14 @@ def find_multiplexing_csv(experiment_name):
     input_dir = os.path.join("input_data", experiment_name)
     
     # Look for CSV files with 'multiplexing' in the name
-    csv_files = glob.glob(os.path.join(input_dir, "*multiplexing_info*.csv"))
+    try:
+        with os.scandir(input_dir) as entries:
+            csv_files = [
+                entry.path for entry in entries
+                if 'multiplexing_info' in entry.name and entry.name.endswith('.csv') and not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        csv_files = []
     
     if csv_files:
         return csv_files[0]
@@ -256,7 +285,14 @@ def find_umi_primers_csv(experiment_name):
     input_dir = os.path.join("input_data", experiment_name)
     
     # Look for CSV files with 'UMI' in the name
-    csv_files = glob.glob(os.path.join(input_dir, "*UMI_primers*.csv"))
+    try:
+        with os.scandir(input_dir) as entries:
+            csv_files = [
+                entry.path for entry in entries
+                if 'UMI_primers' in entry.name and entry.name.endswith('.csv') and not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        csv_files = []
     
     if csv_files:
         return csv_files[0]
@@ -265,6 +301,52 @@ def find_umi_primers_csv(experiment_name):
                            f"Expected file with 'UMI' or 'primer' in the name.")
 
 
+def advise_sequential_read(handle):
+    """Tell the kernel a file will be read front to back so it can read ahead aggressively."""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def read_paired_fastq_records(r1_handle, r2_handle):
+    """
+    Yield matching R1/R2 FASTQ records from two files opened in binary mode.
+    
+    Parameters:
+    -----------
+    r1_handle : file object
+        R1 FASTQ file opened with mode 'rb'
+    r2_handle : file object
+        R2 FASTQ file opened with mode 'rb'
+        
+    Yields:
+    -------
+    tuple
+        (r1_title, r1_sequence, r1_record, r2_title, r2_sequence, r2_record) as bytes:
+        each title without the leading '@', each sequence without its line ending,
+        and each full four-line record as read
+    """
+    # Zipping the file iterators with themselves takes four lines from each file
+    # per step in C, so both mates advance with a single call per read pair
+    r1_lines = iter(r1_handle)
+    r2_lines = iter(r2_handle)
+    for r1_header, r1_seq, r1_plus, r1_qual, r2_header, r2_seq, r2_plus, r2_qual in zip(
+        r1_lines, r1_lines, r1_lines, r1_lines, r2_lines, r2_lines, r2_lines, r2_lines
+    ):
+        r1_record = b"".join((r1_header, r1_seq, r1_plus, r1_qual))
+        r2_record = b"".join((r2_header, r2_seq, r2_plus, r2_qual))
+        if not r1_qual.endswith(b'\n'):
+            r1_record += b'\n'
+        if not r2_qual.endswith(b'\n'):
+            r2_record += b'\n'
+        yield (
+            r1_header[1:].rstrip(b'\r\n'), r1_seq.rstrip(b'\r\n'), r1_record,
+            r2_header[1:].rstrip(b'\r\n'), r2_seq.rstrip(b'\r\n'), r2_record,
+        )
+
+
 def create_umi_dict(population_folder, population_num, gw_name, forward_primer_info, reverse_primer_info):
     """
     Create a UMI dictionary for a single population by processing its fastq files.
@@ -285,8 +367,9 @@ def create_umi_dict(population_folder, population_num, gw_name, forward_primer_i
     Returns:
     --------
     dict
-        Library with (forward_UMI, reverse_UMI) tuples as keys and
-        {'R1': [SeqRecord], 'R2': [SeqRecord], 'R1_trim_pos': pos, 'R2_trim_pos': pos} as values
+        Library with 20-byte forward_UMI + reverse_UMI keys and
+        {'R1': bytearray, 'R2': bytearray, 'read_count': n, 'R1_trim_pos': pos, 'R2_trim_pos': pos}
+        as values, where 'R1'/'R2' hold the untrimmed FASTQ records back to back
     """
     population = f"P{population_num}"
     
@@ -308,37 +391,45 @@ def create_umi_dict(population_folder, population_num, gw_name, forward_primer_i
         'total_reads': 0,
         'reads_with_umi': 0,
         'unmatched_reads': 0,
+        'mismatched_ids': 0,
         'unique_umis': 0
     }
     
+    extract_forward_umi = make_umi_extractor(forward_primer_info)
+    extract_reverse_umi = make_umi_extractor(reverse_primer_info)
+    
     # Parse both fastq files simultaneously
     print(f"  Processing {population}...")
     
-    with open(r1_fastq, 'r') as r1_handle, open(r2_fastq, 'r') as r2_handle, \
-         open(unmatched_r1_fastq, 'w') as unmatched_r1_handle, \
-         open(unmatched_r2_fastq, 'w') as unmatched_r2_handle:
-        r1_records = SeqIO.parse(r1_handle, 'fastq')
-        r2_records = SeqIO.parse(r2_handle, 'fastq')
+    with open(r1_fastq, 'rb', buffering=1 << 20) as r1_handle, \
+         open(r2_fastq, 'rb', buffering=1 << 20) as r2_handle, \
+         open(unmatched_r1_fastq, 'wb', buffering=1 << 20) as unmatched_r1_handle, \
+         open(unmatched_r2_fastq, 'wb', buffering=1 << 20) as unmatched_r2_handle:
+        advise_sequential_read(r1_handle)
+        advise_sequential_read(r2_handle)
         
-        for r1_record, r2_record in zip(r1_records, r2_records):
+        for r1_title, r1_seq, r1_record, r2_title, r2_seq, r2_record in read_paired_fastq_records(r1_handle, r2_handle):
             stats['total_reads'] += 1
             
             # Verify that R1 and R2 match by checking headers
-            r1_id = r1_record.id.split()[0]
-            r2_id = r2_record.id.split()[0]
+            r1_id = r1_title.split()[0]
+            r2_id = r2_title.split()[0]
             
             if r1_id != r2_id:
-                print(f"    Warning: R1 and R2 IDs do not match for {r1_id}")
+                # Warn once and count the rest, rather than printing a line per read
+                if not stats['mismatched_ids']:
+                    print(f"    Warning: R1 and R2 IDs do not match for {r1_id.decode()}")
+                stats['mismatched_ids'] += 1
                 continue
             
             # Extract UMIs from both reads
-            r1_result = extract_umi_from_sequence(r1_record.seq, forward_primer_info)
-            r2_result = extract_umi_from_sequence(r2_record.seq, reverse_primer_info)
+            r1_result = extract_forward_umi(r1_seq)
+            r2_result = extract_reverse_umi(r2_seq)
             
             if r1_result is None or r2_result is None:
                 # Save unmatched sequences to separate fastq files
-                SeqIO.write(r1_record, unmatched_r1_handle, 'fastq')
-                SeqIO.write(r2_record, unmatched_r2_handle, 'fastq')
+                unmatched_r1_handle.write(r1_record)
+                unmatched_r2_handle.write(r2_record)
                 stats['unmatched_reads'] += 1
                 continue
             
@@ -347,40 +438,42 @@ def create_umi_dict(population_folder, population_num, gw_name, forward_primer_i
             
             stats['reads_with_umi'] += 1
             
-            # Create UMI pair key
-            umi_pair = (forward_umi, reverse_umi)
+            # Create UMI pair key: both 10-base UMIs packed into one 20-byte key
+            umi_pair = forward_umi + reverse_umi
             
-            # Initialize UMI entry if it doesn't exist
-            if umi_pair not in umi_library:
-                umi_library[umi_pair] = {
-                    'R1': [],
-                    'R2': [],
+            # Initialize UMI entry if it doesn't exist (one dict lookup for existing pairs)
+            entry = umi_library.get(umi_pair)
+            if entry is None:
+                entry = umi_library[umi_pair] = {
+                    'R1': bytearray(),
+                    'R2': bytearray(),
+                    'read_count': 0,
                     'R1_trim_pos': r1_trim_pos,
                     'R2_trim_pos': r2_trim_pos
                 }
                 stats['unique_umis'] += 1
             
-            # Store full SeqRecord objects (untrimmed) with original ID and quality
+            # Append full records (untrimmed) with original ID and quality to one
+            # buffer per UMI pair instead of keeping a Python object per read
             # Trimming will be done in alignment_prep.py
-            umi_library[umi_pair]['R1'].append(r1_record)
-            umi_library[umi_pair]['R2'].append(r2_record)
+            entry['R1'] += r1_record
+            entry['R2'] += r2_record
+            entry['read_count'] += 1
             
-            # Print progress every 10000 reads
-            if stats['total_reads'] % 10000 == 0:
+            # Print progress every 16384 reads (a bit mask is cheaper than a modulo)
+            if (stats['total_reads'] & 16383) == 0:
                 print(f"    Processed {stats['total_reads']} reads...")
     
-    # Validate that R1 and R2 lists have matching IDs for each UMI
-    for umi_pair, data in umi_library.items():
-        r1_ids = [record.id.split()[0] for record in data['R1']]
-        r2_ids = [record.id.split()[0] for record in data['R2']]
-        if r1_ids != r2_ids:
-            print(f"    Warning: R1 and R2 IDs don't match for UMI {umi_pair}")
+    # R1/R2 IDs were compared before each pair was stored, and both buffers are
+    # appended in lockstep, so no further per-UMI ID validation is needed
     
     # Print summary
     print(f"    Summary for {population}:")
     print(f"      Total reads: {stats['total_reads']}")
     print(f"      Reads with UMI: {stats['reads_with_umi']}")
     print(f"      Unmatched reads: {stats['unmatched_reads']}")
+    if stats['mismatched_ids']:
+        print(f"      Skipped reads with mismatched R1/R2 IDs: {stats['mismatched_ids']}")
     print(f"      Unique UMI pairs: {stats['unique_umis']}")
     if stats['total_reads'] > 0 and stats['unique_umis'] > 0:
         print(f"      Mean reads per UMI: {stats['reads_with_umi'] / stats['unique_umis']:.1f}")
@@ -388,7 +481,72 @@ def create_umi_dict(population_folder, population_num, gw_name, forward_primer_i
     return umi_library
 
 
-def process_all_populations(experiment_name):
+def process_population(output_base, pop_info, primers):
+    """
+    Create and save the UMI dictionary and read counts for one population.
+    
+    Parameters:
+    -----------
+    output_base : str
+        Demultiplexing directory containing the population folders
+    pop_info : dict
+        Dictionary with 'GW_name' and 'Population' from the multiplexing CSV
+    primers : dict
+        Dictionary with 'forward' and 'reverse' primer info from load_primers_from_csv
+        
+    Returns:
+    --------
+    bool
+        True if the UMI library was saved, False if the population folder is missing
+    """
+    gw_name = pop_info['GW_name']
+    population_num = pop_info['Population']
+    population = f"P{population_num}"
+    
+    population_folder = os.path.join(output_base, population)
+    
+    if not os.path.exists(population_folder):
+        print(f"Warning: Population folder not found: {population_folder}")
+        return False
+    
+    # Create UMI dictionary
+    umi_dict = create_umi_dict(
+        population_folder,
+        population_num,
+        gw_name,
+        primers['forward'],
+        primers['reverse']
+    )
+    
+    # Save dictionary as pickle file
+    lib_filename = f"{population}_UMI_dict.pkl"
+    lib_path = os.path.join(population_folder, lib_filename)
+    
+    with open(lib_path, 'wb', buffering=1 << 20) as f:
+        pickle.dump(umi_dict, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    # Save read counts per UMI pair separately so quality checks don't need to
+    # load every stored read
+    counts_filename = f"{population}_UMI_counts.pkl"
+    umi_counts = Counter({umi_pair: data['read_count'] for umi_pair, data in umi_dict.items()})
+    
+    with open(os.path.join(population_folder, counts_filename), 'wb', buffering=1 << 20) as f:
+        pickle.dump(umi_counts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    print(f"  Saved UMI dictionary: {lib_filename}")
+    print(f"  Saved UMI read counts: {counts_filename}\n")
+    return True
+
+
+def _process_population_in_worker(output_base, pop_info, primers):
+    """Run process_population in a worker process, returning (saved, captured terminal output)."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        saved = process_population(output_base, pop_info, primers)
+    return saved, output.getvalue()
+
+
+def process_all_populations(experiment_name, threads=None):
     """
     Process all populations in an experiment to create UMI libraries.
     
@@ -396,6 +554,8 @@ def process_all_populations(experiment_name):
     -----------
     experiment_name : str
         Name of the experiment (e.g., "example")
+    threads : int or None
+        Number of populations to process in parallel (default: one per CPU core)
         
     Returns:
     --------
@@ -448,41 +608,28 @@ def process_all_populations(experiment_name):
     print(f"Found {len(populations)} population(s) in CSV")
     print(f"Output directory: {output_base}\n")
     
-    # Track if any libraries were successfully saved
-    saved_count = 0
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = max(1, min(threads, len(populations)))
     
-    # Process each population
-    for pop_info in populations:
-        gw_name = pop_info['GW_name']
-        population_num = pop_info['Population']
-        population = f"P{population_num}"
-        
-        population_folder = os.path.join(output_base, population)
-        
-        if not os.path.exists(population_folder):
-            print(f"Warning: Population folder not found: {population_folder}")
-            continue
-        
-        # Create UMI dictionary
-        umi_dict = create_umi_dict(
-            population_folder,
-            population_num,
-            gw_name,
-            primers['forward'],
-            primers['reverse']
-        )
-        
-        # Save dictionary as pickle file
-        lib_filename = f"{population}_UMI_dict.pkl"
-        lib_path = os.path.join(population_folder, lib_filename)
-        
-        with open(lib_path, 'wb') as f:
-            pickle.dump(umi_dict, f)
-        
-        print(f"  Saved UMI dictionary: {lib_filename}\n")
-        saved_count += 1
-    
-    return saved_count > 0
+    # Populations are independent, so each one can be processed in its own worker
+    if threads == 1:
+        results = [process_population(output_base, pop_info, primers) for pop_info in populations]
+    else:
+        print(f"Processing populations with {threads} worker processes\n")
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(_process_population_in_worker, output_base, pop_info, primers)
+                for pop_info in populations
+            ]
+            results = []
+            # Print each population's buffered output in CSV order so logs stay readable
+            for future in futures:
+                saved, output = future.result()
+                print(output, end='')
+                results.append(saved)
+    
+    return any(results)
 
 
 def main():
@@ -493,12 +640,21 @@ def main():
         'experiment_name',
         help='Name of the experiment (e.g., "example"). Script will auto-detect multiplexing and UMI primers CSVs from input_data/{experiment_name}/'
     )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Number of populations to process in parallel (default: number of CPU cores)'
+    )
     
     args = parser.parse_args()
 
+    if args.threads is not None and args.threads < 1:
+        parser.error('--threads must be an integer >= 1')
+
     setup_terminal_logging(args.experiment_name, "demultiplex_UMI")
     
-    success = process_all_populations(args.experiment_name)
+    success = process_all_populations(args.experiment_name, args.threads)
     
     if success:
         print("="*60)
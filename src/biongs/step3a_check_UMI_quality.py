@@ -19,6 +19,7 @@ import glob
 import argparse
 from collections import Counter
 import altair as alt
+import numpy as np
 import pandas as pd
 from Bio import SeqIO
 
@@ -74,40 +75,81 @@ def load_umi_dict(library_path):
     return umi_dict
 
 
-def analyze_umi_dict(umi_dict):
+def load_umi_counts(library_path):
     """
-    Analyze a UMI dictionary and extract quality metrics.
+    Load read counts per UMI pair for a population.
+    
+    Uses the P{Population}_UMI_counts.pkl file saved next to the UMI dictionary when
+    available, so the stored reads never need to be unpickled. Falls back to counting
+    reads in the full UMI dictionary for libraries created before that file existed.
     
     Parameters:
     -----------
-    umi_dict : dict
-        UMI dictionary structure
+    library_path : str
+        Path to the UMI dictionary pickle file
+        
+    Returns:
+    --------
+    dict
+        Mapping of UMI pair to number of reads
+    """
+    counts_path = library_path.replace('_UMI_dict.pkl', '_UMI_counts.pkl')
+    if os.path.exists(counts_path):
+        with open(counts_path, 'rb') as f:
+            return pickle.load(f)
+    
+    umi_dict = load_umi_dict(library_path)
+    return Counter({umi_pair: sequences.get('read_count', len(sequences['R1'])) for umi_pair, sequences in umi_dict.items()})
+
+
+def analyze_umi_counts(umi_counts):
+    """
+    Extract quality metrics from read counts per UMI pair.
+    
+    Parameters:
+    -----------
+    umi_counts : dict
+        Mapping of UMI pair to number of reads
         
     Returns:
     --------
     dict
         Dictionary containing:
         - num_umis: Total number of unique UMI pairs
-        - reads_per_umi: List of read counts for each UMI
+        - reads_per_umi: NumPy array of read counts for each UMI
         - total_reads: Total number of reads in dictionary
         - min_reads_per_umi: Minimum reads among UMI pairs
         - max_reads_per_umi: Maximum reads among UMI pairs
     """
-    reads_per_umi = []
-    
-    for umi_pair, sequences in umi_dict.items():
-        num_reads = len(sequences['R1'])
-        reads_per_umi.append(num_reads)
+    reads_per_umi = np.fromiter(umi_counts.values(), dtype=np.int64, count=len(umi_counts))
+    has_reads = reads_per_umi.size > 0
     
     return {
-        'num_umis': len(umi_dict),
+        'num_umis': len(umi_counts),
         'reads_per_umi': reads_per_umi,
-        'total_reads': sum(reads_per_umi) if reads_per_umi else 0,
-        'min_reads_per_umi': min(reads_per_umi) if reads_per_umi else 0,
-        'max_reads_per_umi': max(reads_per_umi) if reads_per_umi else 0,
+        'total_reads': int(reads_per_umi.sum()),
+        'min_reads_per_umi': int(reads_per_umi.min()) if has_reads else 0,
+        'max_reads_per_umi': int(reads_per_umi.max()) if has_reads else 0,
     }
 
 
+def analyze_umi_dict(umi_dict):
+    """
+    Analyze a UMI dictionary and extract quality metrics.
+    
+    Parameters:
+    -----------
+    umi_dict : dict
+        UMI dictionary structure
+        
+    Returns:
+    --------
+    dict
+        Same metrics as analyze_umi_counts
+    """
+    return analyze_umi_counts({umi_pair: sequences.get('read_count', len(sequences['R1'])) for umi_pair, sequences in umi_dict.items()})
+
+
 def count_unmatched_reads(population_folder, population):
     """
     Count the number of unmatched UMI reads for a population.
@@ -210,6 +252,53 @@ def create_umi_count_plot(libraries_data, output_dir):
         print(f"  Warning: Could not save PNG. Error: {e}")
 
 
+def compute_reads_per_umi_density(reads_per_umi, steps=200):
+    """
+    Estimate the density of reads per UMI for a violin plot.
+    
+    Mirrors Vega's density transform (Gaussian KDE with Scott's bandwidth,
+    sampled across the observed extent) but works on the distinct read counts
+    weighted by how often they occur, so only the curve is embedded in the chart.
+    
+    Parameters:
+    -----------
+    reads_per_umi : numpy.ndarray
+        Read counts for each UMI pair
+    steps : int
+        Number of points at which to sample the density (default: 200)
+        
+    Returns:
+    --------
+    tuple
+        (sample points, density values) as NumPy arrays
+    """
+    values, weights = np.unique(reads_per_umi, return_counts=True)
+    n = int(weights.sum())
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    values = values.astype(np.float64)
+    
+    # Weighted sample standard deviation and interquartile range
+    mean = np.dot(values, weights) / n
+    deviation = np.sqrt(np.dot((values - mean) ** 2, weights) / (n - 1)) if n > 1 else 0.0
+    cumulative = np.cumsum(weights)
+    
+    def quantile(p):
+        position = p * (n - 1)
+        lower = int(position)
+        lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+        upper_value = values[np.searchsorted(cumulative, min(lower + 1, n - 1), side='right')]
+        return lower_value + (upper_value - lower_value) * (position - lower)
+    
+    spread = min(deviation, (quantile(0.75) - quantile(0.25)) / 1.34) or deviation or abs(quantile(0.25)) or 1.0
+    bandwidth = 1.06 * spread * n ** -0.2
+    
+    grid = np.linspace(values[0], values[-1], steps)
+    kernel = np.exp(-0.5 * ((grid[:, None] - values[None, :]) / bandwidth) ** 2)
+    density = kernel @ weights / (n * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+
 def create_reads_per_umi_plot(libraries_data, output_dir):
     """
     Create violin plots comparing the distribution of reads per UMI across populations.
@@ -223,21 +312,16 @@ def create_reads_per_umi_plot(libraries_data, output_dir):
     """
     populations = sorted(libraries_data.keys())
     
-    # Create DataFrame with all data points
-    data_rows = []
-    for pop in populations:
-        reads_per_umi = libraries_data[pop]['reads_per_umi']
-        for count in reads_per_umi:
-            data_rows.append({'Population': pop, 'Reads_per_UMI': count})
-    
-    df = pd.DataFrame(data_rows)
+    # Precompute one density curve per population so the chart only carries the curves
+    curves = [compute_reads_per_umi_density(libraries_data[pop]['reads_per_umi']) for pop in populations]
+    df = pd.DataFrame({
+        'Population': np.repeat(populations, [len(grid) for grid, _ in curves]),
+        'Reads_per_UMI': np.concatenate([grid for grid, _ in curves]),
+        'Density': np.concatenate([density for _, density in curves]),
+    })
     
     # Create violin plots by faceting one panel per population
-    violin = alt.Chart(df).transform_density(
-        'Reads_per_UMI',
-        as_=['Reads_per_UMI', 'Density'],
-        groupby=['Population']
-    ).mark_area(
+    violin = alt.Chart(df).mark_area(
         orient='horizontal',
         opacity=0.7,
         color='steelblue'
@@ -390,12 +474,11 @@ def create_summary_statistics_plot(libraries_data, output_dir):
             f.write(f"  Number of unique UMI pairs: {data['num_umis']}\n")
             f.write(f"  Total reads: {data['total_reads']}\n")
             
-            if reads_per_umi:
-                reads_series = pd.Series(reads_per_umi)
-                f.write(f"  Reads per UMI - Min: {reads_series.min()}, ")
-                f.write(f"Max: {reads_series.max()}, ")
-                f.write(f"Mean: {reads_series.mean():.1f}, ")
-                f.write(f"Median: {reads_series.median():.1f}\n")
+            if len(reads_per_umi):
+                f.write(f"  Reads per UMI - Min: {data['min_reads_per_umi']}, ")
+                f.write(f"Max: {data['max_reads_per_umi']}, ")
+                f.write(f"Mean: {reads_per_umi.mean():.1f}, ")
+                f.write(f"Median: {np.median(reads_per_umi):.1f}\n")
             f.write("\n")
     
     print(f"  Saved: {output_path}")
@@ -435,8 +518,8 @@ def check_umi_quality(experiment_name):
     for population, lib_path in libraries.items():
         print(f"  Loading {population}...")
         try:
-            umi_dict = load_umi_dict(lib_path)
-            libraries_data[population] = analyze_umi_dict(umi_dict)
+            umi_counts = load_umi_counts(lib_path)
+            libraries_data[population] = analyze_umi_counts(umi_counts)
             print(f"    UMI pairs: {libraries_data[population]['num_umis']}, "
                   f"Total reads: {libraries_data[population]['total_reads']}")
             print(f"    Reads per UMI - Min: {libraries_data[population]['min_reads_per_umi']}, "
@@ -21,8 +21,6 @@ import sys
 import atexit
 from datetime import datetime
 from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 
 
 class TeeStream:
@@ -118,13 +116,38 @@ def load_umi_dict(library_path):
     Returns:
     --------
     dict
-        UMI dictionary: {(forward_UMI, reverse_UMI): {'R1': [SeqRecord], 'R2': [SeqRecord], 'R1_trim_pos': pos, ...}}
+        UMI dictionary: {(forward_UMI, reverse_UMI): {'R1': bytearray, 'R2': bytearray, 'read_count': n, ...}}
     """
     with open(library_path, 'rb') as f:
         umi_dict = pickle.load(f)
     return umi_dict
 
 
+def write_trimmed_records(records, trim_pos, description, output_path):
+    """
+    Write raw FASTQ records from Step 3 to a file, trimming sequence and quality.
+    
+    Parameters:
+    -----------
+    records : bytes or bytearray
+        Untrimmed four-line FASTQ records stored back to back by Step 3
+    trim_pos : int
+        Position where the trimmed read starts
+    description : bytes
+        Description appended to each read ID (e.g., b"UMI:AAAA_CCCC")
+    output_path : str
+        Path to the output FASTQ file
+    """
+    lines = records.splitlines()
+    with open(output_path, 'wb') as handle:
+        handle.writelines(
+            b"@%b %b\n%b\n+\n%b\n" % (
+                lines[i][1:].split(None, 1)[0], description, lines[i + 1][trim_pos:], lines[i + 3][trim_pos:]
+            )
+            for i in range(0, len(lines), 4)
+        )
+
+
 def trim_and_prepare_sequences(umi_dict, population, output_dir, min_reads_per_umi=1):
     """
     Trim sequences using stored trim positions and write to FASTQ files by UMI pair.
@@ -159,10 +182,15 @@ def trim_and_prepare_sequences(umi_dict, population, output_dir, min_reads_per_u
     os.makedirs(pop_output_dir, exist_ok=True)
     
     for umi_pair, data in umi_dict.items():
-        forward_umi, reverse_umi = umi_pair
+        if isinstance(umi_pair, bytes):
+            # Current dictionaries key each pair as forward + reverse UMI (10 bases each)
+            umi_pair = umi_pair.decode('ascii')
+            forward_umi, reverse_umi = umi_pair[:10], umi_pair[10:]
+        else:
+            forward_umi, reverse_umi = umi_pair
         
         # Only process UMI pairs that meet the minimum read threshold
-        num_sequences = len(data['R1'])
+        num_sequences = data['read_count'] if 'read_count' in data else len(data['R1'])
         if num_sequences < min_reads_per_umi:
             stats['umis_skipped_below_threshold'] += 1
             continue
@@ -171,53 +199,53 @@ def trim_and_prepare_sequences(umi_dict, population, output_dir, min_reads_per_u
         r1_trim_pos = data['R1_trim_pos']
         r2_trim_pos = data['R2_trim_pos']
         
+        umi_safe_name = f"{forward_umi}_{reverse_umi}"
+        r1_output_path = os.path.join(pop_output_dir, f"{umi_safe_name}_R1.fastq")
+        r2_output_path = os.path.join(pop_output_dir, f"{umi_safe_name}_R2.fastq")
+        
+        # Current dictionaries store raw FASTQ records back to back in one buffer
+        if isinstance(data['R1'], (bytes, bytearray)):
+            description = f"UMI:{umi_safe_name}".encode('ascii')
+            write_trimmed_records(data['R1'], r1_trim_pos, description, r1_output_path)
+            write_trimmed_records(data['R2'], r2_trim_pos, description, r2_output_path)
+            stats['total_reads_trimmed'] += num_sequences
+            stats['umi_files_created'] += 1
+            continue
+        
+        # Backward-compatible handling for older dictionaries that stored string sequences + IDs
+        has_legacy_ids = ('R1_ids' in data and 'R2_ids' in data)
+
+        if has_legacy_ids:
+            # Slice the stored strings directly and write with a constant Phred 40 ('I') quality
+            description = f"UMI:{umi_safe_name}"
+            with open(r1_output_path, 'w') as r1_handle, open(r2_output_path, 'w') as r2_handle:
+                for r1_seq, r2_seq, r1_id, r2_id in zip(data['R1'], data['R2'], data['R1_ids'], data['R2_ids']):
+                    trimmed_r1_seq = r1_seq[r1_trim_pos:]
+                    trimmed_r2_seq = r2_seq[r2_trim_pos:]
+                    r1_handle.write(f"@{r1_id} {description}\n{trimmed_r1_seq}\n+\n{'I' * len(trimmed_r1_seq)}\n")
+                    r2_handle.write(f"@{r2_id} {description}\n{trimmed_r2_seq}\n+\n{'I' * len(trimmed_r2_seq)}\n")
+                    stats['total_reads_trimmed'] += 1
+            stats['umi_files_created'] += 1
+            continue
+
         # Create FASTQ records with trimmed sequences
         r1_records = []
         r2_records = []
 
-        # Backward-compatible handling for older dictionaries that stored string sequences + IDs
-        has_legacy_ids = ('R1_ids' in data and 'R2_ids' in data)
+        for r1_record, r2_record in zip(data['R1'], data['R2']):
+            # Records are SeqRecord objects; slicing preserves per-base quality annotations
+            trimmed_r1_record = r1_record[r1_trim_pos:]
+            trimmed_r2_record = r2_record[r2_trim_pos:]
 
-        if has_legacy_ids:
-            for r1_seq, r2_seq, r1_id, r2_id in zip(data['R1'], data['R2'], data['R1_ids'], data['R2_ids']):
-                trimmed_r1_seq = r1_seq[r1_trim_pos:]
-                trimmed_r2_seq = r2_seq[r2_trim_pos:]
-
-                r1_record = SeqRecord(
-                    Seq(trimmed_r1_seq),
-                    id=r1_id,
-                    description=f"UMI:{forward_umi}_{reverse_umi}",
-                    letter_annotations={"phred_quality": [40] * len(trimmed_r1_seq)}
-                )
-                r2_record = SeqRecord(
-                    Seq(trimmed_r2_seq),
-                    id=r2_id,
-                    description=f"UMI:{forward_umi}_{reverse_umi}",
-                    letter_annotations={"phred_quality": [40] * len(trimmed_r2_seq)}
-                )
-
-                r1_records.append(r1_record)
-                r2_records.append(r2_record)
-                stats['total_reads_trimmed'] += 1
-        else:
-            for r1_record, r2_record in zip(data['R1'], data['R2']):
-                # Records are SeqRecord objects; slicing preserves per-base quality annotations
-                trimmed_r1_record = r1_record[r1_trim_pos:]
-                trimmed_r2_record = r2_record[r2_trim_pos:]
-
-                # Keep IDs/quality from source and annotate description with UMI pair
-                trimmed_r1_record.description = f"UMI:{forward_umi}_{reverse_umi}"
-                trimmed_r2_record.description = f"UMI:{forward_umi}_{reverse_umi}"
-
-                r1_records.append(trimmed_r1_record)
-                r2_records.append(trimmed_r2_record)
-                stats['total_reads_trimmed'] += 1
+            # Keep IDs/quality from source and annotate description with UMI pair
+            trimmed_r1_record.description = f"UMI:{forward_umi}_{reverse_umi}"
+            trimmed_r2_record.description = f"UMI:{forward_umi}_{reverse_umi}"
+
+            r1_records.append(trimmed_r1_record)
+            r2_records.append(trimmed_r2_record)
+            stats['total_reads_trimmed'] += 1
         
         # Write trimmed sequences to FASTQ files
-        umi_safe_name = f"{forward_umi}_{reverse_umi}"
-        r1_output_path = os.path.join(pop_output_dir, f"{umi_safe_name}_R1.fastq")
-        r2_output_path = os.path.join(pop_output_dir, f"{umi_safe_name}_R2.fastq")
-        
         SeqIO.write(r1_records, r1_output_path, "fastq")
         SeqIO.write(r2_records, r2_output_path, "fastq")
         
@@ -0,0 +1,75 @@
+"""Tests for Step 3 UMI extraction and dictionary building."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from biongs import step3_demultiplex_UMI as demultiplex_umi
+
+
+FORWARD_PRIMER = "ACGTNNNNNNNNNNGGCC"
+REVERSE_PRIMER = "TTGANNNNNNNNNNCCAA"
+
+
+def _fastq(records):
+    return "".join(f"@{title}\n{seq}\n+\n{'I' * len(seq)}\n" for title, seq in records)
+
+
+def test_parse_primer_for_umi():
+    info = demultiplex_umi.parse_primer_for_umi(FORWARD_PRIMER.lower())
+
+    assert info["before"] == b"ACGT"
+    assert info["after"] == b"GGCC"
+    assert info["umi_start"] == 4
+    assert info["umi_end"] == 14
+    assert info["full_primer"] == FORWARD_PRIMER
+
+
+def test_extract_umi_from_sequence():
+    info = demultiplex_umi.parse_primer_for_umi(FORWARD_PRIMER)
+
+    assert demultiplex_umi.extract_umi_from_sequence(b"TTACGTAAAAACCCCCGGCCTTT", info) == (b"AAAAACCCCC", 20)
+    assert demultiplex_umi.extract_umi_from_sequence(b"TTACGTAAAAACCCCCGGAA", info) is None
+    assert demultiplex_umi.extract_umi_from_sequence(b"TTTTTTTTTT", info) is None
+
+
+def test_create_umi_dict(tmp_path):
+    forward = demultiplex_umi.parse_primer_for_umi(FORWARD_PRIMER)
+    reverse = demultiplex_umi.parse_primer_for_umi(REVERSE_PRIMER)
+
+    pop_folder = tmp_path / "P1"
+    pop_folder.mkdir()
+    (pop_folder / "P1_R1.fastq").write_text(
+        _fastq([
+            ("read1 1:N:0", "ACGTAAAAACCCCCGGCCTAGC"),
+            ("read2 1:N:0", "ACGTAAAAACCCCCGGCCTAGG"),
+            ("read3 1:N:0", "CCCCCCCCCCCCCCCCCCCCCC"),
+        ]),
+        encoding="utf-8",
+    )
+    (pop_folder / "P1_R2.fastq").write_text(
+        _fastq([
+            ("read1 2:N:0", "TTGAGGGGGTTTTTCCAAATAT"),
+            ("read2 2:N:0", "TTGAGGGGGTTTTTCCAAATAA"),
+            ("read3 2:N:0", "TTGAGGGGGTTTTTCCAAATAA"),
+        ]),
+        encoding="utf-8",
+    )
+
+    umi_dict = demultiplex_umi.create_umi_dict(str(pop_folder), "1", "gw", forward, reverse)
+
+    assert list(umi_dict) == [b"AAAAACCCCCGGGGGTTTTT"]
+    entry = umi_dict[b"AAAAACCCCCGGGGGTTTTT"]
+    assert entry["R1_trim_pos"] == 18
+    assert entry["R2_trim_pos"] == 18
+    assert entry["read_count"] == 2
+    assert entry["R1"] == _fastq([
+        ("read1 1:N:0", "ACGTAAAAACCCCCGGCCTAGC"),
+        ("read2 1:N:0", "ACGTAAAAACCCCCGGCCTAGG"),
+    ]).encode("ascii")
+
+    unmatched = (pop_folder / "P1_unmatched_UMI_R1.fastq").read_text(encoding="utf-8")
+    assert unmatched == _fastq([("read3 1:N:0", "CCCCCCCCCCCCCCCCCCCCCC")])
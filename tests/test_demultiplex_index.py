@@ -0,0 +1,94 @@
+"""Tests for Step 2 index demultiplexing."""
+
+from __future__ import annotations
+
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from biongs import step2_demultiplex_index as demultiplex_index
+
+
+POPULATION = {
+    "GW_name": "gw",
+    "Population": "1",
+    "Time": "0",
+    "R1_index": "GCGTGACA",
+    "R2_index": "GATGTACA",
+}
+
+
+def _fastq(records):
+    return "".join(f"@{title}\n{seq}\n+\n{'F' * len(seq)}\n" for title, seq in records)
+
+
+def test_process_gw_reads(tmp_path):
+    r1_fastq = tmp_path / "gw_R1_001.fastq.gz"
+    r2_fastq = tmp_path / "gw_R2_001.fastq.gz"
+    with gzip.open(r1_fastq, "wt") as handle:
+        handle.write(_fastq([
+            ("read1 1:N:0", "GCGTGACAAAAA"),
+            ("read2 1:N:0", "TTTTTTTTAAAA"),
+            ("read3 1:N:0", "GCGTGACA"),
+        ]))
+    with gzip.open(r2_fastq, "wt") as handle:
+        handle.write(_fastq([
+            ("read1 2:N:0", "GATGTACACCCC"),
+            ("read2 2:N:0", "GATGTACACCCC"),
+            ("read3 2:N:0", "GATGTACACCCC"),
+        ]))
+    (tmp_path / "P1").mkdir()
+    (tmp_path / "P2").mkdir()
+    other_population = dict(POPULATION, Population="2", R1_index="TTTTTTTT")
+
+    counts = demultiplex_index.process_gw_reads(
+        "gw", [POPULATION, other_population], str(r1_fastq), str(r2_fastq), str(tmp_path), short_read_length=10
+    )
+
+    assert counts == {
+        "total": 3,
+        "short": 1,
+        "unmatched": 0,
+        "matched": 2,
+        "matched_by_population": {"P1": 1, "P2": 1},
+    }
+    assert (tmp_path / "P1" / "P1_R1.fastq").read_text() == _fastq([("read1 1:N:0", "GCGTGACAAAAA")])
+    assert (tmp_path / "P1" / "P1_R2.fastq").read_text() == _fastq([("read1 2:N:0", "GATGTACACCCC")])
+    assert (tmp_path / "P2" / "P2_R1.fastq").read_text() == _fastq([("read2 1:N:0", "TTTTTTTTAAAA")])
+    assert (tmp_path / "gw_unmatched_reads_R1.fastq").read_text() == ""
+    assert (tmp_path / "gw_short_reads_R1.fastq").read_text() == _fastq([("read3 1:N:0", "GCGTGACA")])
+
+
+def test_find_fastq_files_prefers_uncompressed(tmp_path, monkeypatch):
+    fastq_dir = tmp_path / "input_data" / "exp" / "exp_fastq"
+    fastq_dir.mkdir(parents=True)
+    for name in ["gw_R1_001.fastq.gz", "gw_R1_001.fastq", "gw_R2_001.fq.gz", "other_R1_001.fastq", ".gw_R2_001.fastq"]:
+        (fastq_dir / name).write_bytes(b"")
+    monkeypatch.chdir(tmp_path)
+
+    fastq_paths = demultiplex_index.list_input_fastq_files("exp")
+
+    assert len(fastq_paths) == 4
+    assert demultiplex_index.find_fastq_files("exp", "gw", fastq_paths) == (
+        str(Path("input_data/exp/exp_fastq/gw_R1_001.fastq")),
+        str(Path("input_data/exp/exp_fastq/gw_R2_001.fq.gz")),
+    )
+    assert demultiplex_index.find_fastq_files("exp", "missing") is None
+
+
+def test_demultiplex_gw_with_empty_fastqs(tmp_path, capsys):
+    r1_fastq = tmp_path / "gw_R1_001.fastq"
+    r2_fastq = tmp_path / "gw_R2_001.fastq"
+    r1_fastq.write_bytes(b"")
+    r2_fastq.write_bytes(b"")
+    (tmp_path / "P1").mkdir()
+
+    counts = demultiplex_index.demultiplex_gw(
+        "exp", "gw", [POPULATION], str(tmp_path), fastq_paths=[str(r1_fastq), str(r2_fastq)]
+    )
+
+    assert counts["total"] == 0
+    assert counts["matched_by_population"] == {"P1": 0}
+    assert "No reads found" in capsys.readouterr().out
@@ -69,3 +69,20 @@ def test_run_script_0_5_with_mocked_fastqc(tmp_path, monkeypatch):
     assert html_names == ["P22R1_R1_001_fastqc.html", "P22R1_R2_001_fastqc.html"]
     assert not (tmp_path / "results" / experiment / "qc" / "P22R1_R1_001_fastqc.zip").exists()
     assert not (tmp_path / "results" / experiment / "qc" / "P22R1_R2_001_fastqc.zip").exists()
+
+
+def test_run_fastqc_uses_one_thread_per_file(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fast_qc.shutil, "which", lambda name: "/usr/bin/fastqc")
+    monkeypatch.setattr(fast_qc.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(fast_qc.subprocess, "run", lambda cmd, check: calls.append(cmd))
+
+    fastq_files = [tmp_path / "a_R1.fastq", tmp_path / "a_R2.fastq"]
+    fast_qc.run_fastqc(fastq_files, tmp_path / "qc")
+
+    assert len(calls) == 1
+    cmd = calls[0]
+    assert cmd[0] == "/usr/bin/fastqc"
+    assert cmd[cmd.index("--threads") + 1] == "2"
+    assert "--noextract" in cmd
+    assert cmd[-2:] == [str(path) for path in fastq_files]